@@ -1,12 +1,25 @@
 from .auth_node import VertexAIAuth
 from .image_node import VertexGeminiImageGenerator
 from .text_node import VertexGeminiTextGenerator
+from .chat_node import VertexGeminiChatSession
+from .usage_node import VertexUsageSummary
+from .sweep_node import VertexPromptSweep
 from .config_nodes import VertexGenerationConfig, VertexSaveConfig, VertexLoadConfig
+from .server_routes import register_routes
+from .warmup import start_warmup
+from .scheduler import install_prompt_queue_priority
+
+register_routes()
+install_prompt_queue_priority()
+start_warmup()
 
 NODE_CLASS_MAPPINGS = {
     "VertexAIAuth": VertexAIAuth,
     "VertexGeminiImageGenerator": VertexGeminiImageGenerator,
     "VertexGeminiTextGenerator": VertexGeminiTextGenerator,
+    "VertexGeminiChatSession": VertexGeminiChatSession,
+    "VertexUsageSummary": VertexUsageSummary,
+    "VertexPromptSweep": VertexPromptSweep,
     "VertexGenerationConfig": VertexGenerationConfig,
     "VertexSaveConfig": VertexSaveConfig,
     "VertexLoadConfig": VertexLoadConfig
@@ -16,6 +29,9 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "VertexAIAuth": "Vertex AI Auth/Config",
     "VertexGeminiImageGenerator": "Vertex AI Image (Gemini 3/Imagen)",
     "VertexGeminiTextGenerator": "Vertex AI Text (Gemini LLM)",
+    "VertexGeminiChatSession": "Vertex AI Chat Session (Multi-turn)",
+    "VertexUsageSummary": "Vertex AI Usage Summary",
+    "VertexPromptSweep": "Vertex AI Prompt Sweep (JSONL/CSV)",
     "VertexGenerationConfig": "Vertex Generation Config",
     "VertexSaveConfig": "Vertex Save Config",
     "VertexLoadConfig": "Vertex Load Config"
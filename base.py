@@ -1,13 +1,37 @@
 import os
+import io
+import json
+import time
+import threading
+import base64
+import requests
 import torch
 import numpy as np
-from .utils import HAS_GOOGLE_AUTH
+from PIL import Image
+from .utils import HAS_GOOGLE_AUTH, parse_endpoint, get_http_session
+from .ledger import LEDGER, extract_usage
+from .scheduler import SCHEDULER, current_workflow_id
+from .cassette import CASSETTE, CASSETTE_MODE, CassetteMiss
+from .encoding import encode_body
+from .circuit_breaker import BREAKER, FALLBACK_LOCATIONS, is_endpoint_failure
 
 if HAS_GOOGLE_AUTH:
     from google.oauth2 import service_account
     import google.auth
     import google.auth.transport.requests
 
+# service account 凭证缓存 (文件路径 -> credentials)
+_CREDENTIALS_CACHE = {}
+_CREDENTIALS_LOCK = threading.Lock()
+
+
+class VertexAPIError(Exception):
+    """Vertex AI 请求失败，response 为原始 HTTP 响应 (超时、连接错误时为 None)"""
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+
+
 class VertexBase:
     """基础类，处理认证和通用逻辑"""
     def get_access_token(self, service_account_filename):
@@ -25,10 +49,15 @@ class VertexBase:
             service_account_json = json.load(f)
             location = service_account_json.get('location')
         if service_account_path and os.path.exists(service_account_path) and os.path.isfile(service_account_path):
-            scopes = ['https://www.googleapis.com/auth/cloud-platform']
-            creds = service_account.Credentials.from_service_account_file(service_account_path, scopes=scopes)
-            auth_req = google.auth.transport.requests.Request()
-            creds.refresh(auth_req)
+            # token 未过期时直接复用，避免每次请求都重新获取
+            with _CREDENTIALS_LOCK:
+                creds = _CREDENTIALS_CACHE.get(service_account_path)
+                if creds is None or not creds.valid:
+                    scopes = ['https://www.googleapis.com/auth/cloud-platform']
+                    creds = service_account.Credentials.from_service_account_file(service_account_path, scopes=scopes)
+                    auth_req = google.auth.transport.requests.Request()
+                    creds.refresh(auth_req)
+                    _CREDENTIALS_CACHE[service_account_path] = creds
             return location,creds.token, creds.project_id
         
         # 2. 其次尝试使用环境默认凭证
@@ -38,5 +67,202 @@ class VertexBase:
         creds.refresh(auth_req)
         return location,creds.token, project_id
 
+    def read_service_account_info(self, service_account_filename):
+        """不刷新 token，只读取 service account 文件中的 location 和 project_id"""
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        service_account_path = os.path.join(current_dir, "key", service_account_filename)
+        with open(service_account_path, 'r') as f:
+            service_account_json = json.load(f)
+        return service_account_json.get('location'), "", service_account_json.get('project_id')
+
+    def resolve_endpoint(self, vertex_config, target_model, method="streamGenerateContent"):
+        """
+        根据 vertex_config 构造请求 URL 和 Headers
+        优先从 config 文件中读取认证信息，API Key 优先于 Service Account
+        """
+        vertex_config_file = vertex_config.get("config_file")
+        if vertex_config_file:
+            from .utils import load_config_file
+            loaded_config = load_config_file(vertex_config_file).get('vertex_config') or {}
+            service_account_json = loaded_config.get('service_account_json')
+            api_key = loaded_config.get('api_key')
+        else:
+            service_account_json = vertex_config.get("service_account_json")
+            api_key = vertex_config.get('api_key')
+
+        if api_key:
+            # 使用 API Key 方式
+            url = f"https://aiplatform.googleapis.com/v1/publishers/google/models/{target_model}:{method}?key={api_key}"
+            headers = {"Content-Type": "application/json"}
+        else:
+            # 使用 OAuth 方式
+            if CASSETTE_MODE == "replay":
+                # 回放模式不联网，只从 service account 文件中读取 location 和 project
+                (location, token, auth_project_id) = self.read_service_account_info(service_account_json)
+            else:
+                (location, token, auth_project_id) = self.get_access_token(service_account_json)
+            url = f"https://{location}-aiplatform.googleapis.com/v1/projects/{auth_project_id}/locations/{location}/publishers/google/models/{target_model}:{method}"
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json; charset=utf-8"
+            }
+        return url, headers
+
     def pil2tensor(self, image):
         return torch.from_numpy(np.array(image).astype(np.float32) / 255.0).unsqueeze(0)
+
+    def decode_pil_part(self, part):
+        """将响应中的 inlineData part 解码为 PIL 图片，不是图片时返回 None"""
+        data_str = part.get('inlineData', {}).get('data')
+        if not data_str:
+            return None
+        return Image.open(io.BytesIO(base64.b64decode(data_str))).convert('RGB')
+
+    def decode_image_part(self, part):
+        """将响应中的 inlineData part 解码为图片 tensor，不是图片时返回 None"""
+        img = self.decode_pil_part(part)
+        return self.pil2tensor(img) if img is not None else None
+
+    def build_payload(self, contents, generation_config=None, image_config=None):
+        """
+        构建 generateContent 请求体
+        Returns: (payload, gen_config_payload)
+        """
+        # 默认值
+        gen_config_payload = {
+            "temperature": 1.0,
+            "maxOutputTokens": 32768,
+            "topP": 0.95,
+            "responseModalities": ["TEXT", "IMAGE"],
+        }
+        if image_config:
+            gen_config_payload["imageConfig"] = image_config
+
+        # 默认 Safety Settings (默认为 OFF)
+        threshold_val = "OFF"
+        safety_settings_payload = [
+            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": threshold_val},
+            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": threshold_val},
+            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": threshold_val},
+            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": threshold_val}
+        ]
+
+        # 如果有传入 config，则合并
+        if generation_config:
+            # 顶层参数
+            for key in ["temperature", "topP", "maxOutputTokens", "responseModalities"]:
+                if key in generation_config:
+                    gen_config_payload[key] = generation_config[key]
+
+            # 注意：imageConfig 不从 generation_config 读取，强制使用节点参数
+
+            # safetySettings 参数
+            if "safetySettings" in generation_config:
+                safety_settings_payload = generation_config["safetySettings"]
+
+        payload = {
+            "contents": contents,
+            "generationConfig": gen_config_payload,
+            "safetySettings": safety_settings_payload
+        }
+
+        # systemInstruction 参数 (从 config 读取)
+        if generation_config and "systemInstruction" in generation_config:
+            payload["systemInstruction"] = generation_config["systemInstruction"]
+
+        return payload, gen_config_payload
+
+    def post_generate(self, url, headers, payload, timeout=120, priority="interactive", on_chunk=None):
+        """
+        发送生成请求并返回结果列表
+        streamGenerateContent 返回 JSON 数组 [...]，generateContent 返回单个对象
+        传入 on_chunk 时使用 SSE 流式接收，每个 chunk 解析后立即回调
+        请求经过全局调度器按优先级排队，endpoint 熔断时切换备用区域或直接失败，
+        每次调用的延迟和用量都会记录到用量账本
+        """
+        location, model = parse_endpoint(url)
+        # 账本按接口区分生成调用和 countTokens 调用
+        method = url.split("?")[0].rsplit(":", 1)[-1]
+
+        # 回放模式直接从 cassette 读取响应，不发送网络请求
+        if CASSETTE is not None:
+            cassette_key = CASSETTE.request_key(url, payload)
+            if CASSETTE_MODE == "replay":
+                start = time.time()
+                result_list = CASSETTE.load(cassette_key)
+                if result_list is None:
+                    raise CassetteMiss(f"Cassette miss: no recorded response for {model} request {cassette_key}")
+                if on_chunk:
+                    for result in result_list:
+                        on_chunk(result)
+                LEDGER.record(model=model, location=location, method=method, latency=time.time() - start, ok=True, cache_hit=True, **extract_usage(result_list))
+                return result_list
+
+        # 熔断检查：endpoint 不可用时切换到备用区域，没有可用区域则直接失败
+        url, location = BREAKER.select_endpoint(url, location, model, FALLBACK_LOCATIONS)
+        breaker_key = (location, model)
+        BREAKER.before_request(breaker_key)
+
+        # 直接拼接已编码的 base64 数据生成请求体，可选 gzip 压缩
+        body, extra_headers = encode_body(payload)
+        headers = dict(headers, **extra_headers)
+
+        stream = on_chunk is not None and ":streamGenerateContent" in url
+        if stream:
+            url += ("&" if "?" in url else "?") + "alt=sse"
+
+        start = time.time()
+        first_chunk = None
+        try:
+            with SCHEDULER.slot(priority, current_workflow_id()):
+                start = time.time()
+                response = get_http_session().post(url, headers=headers, data=body, timeout=timeout, stream=stream)
+                response.raise_for_status()
+                if stream:
+                    # SSE 格式：每个 chunk 为一行 "data: {...}"
+                    result_list = []
+                    for line in response.iter_lines(chunk_size=65536):
+                        if line.startswith(b"data:"):
+                            if first_chunk is None:
+                                first_chunk = time.time() - start
+                            result = json.loads(line[5:])
+                            result_list.append(result)
+                            on_chunk(result)
+        except requests.exceptions.RequestException as e:
+            latency = time.time() - start
+            if is_endpoint_failure(e):
+                BREAKER.record_failure(breaker_key, e)
+            else:
+                # 4xx 说明 endpoint 本身是正常的
+                BREAKER.record_success(breaker_key, latency)
+            LEDGER.record(model=model, location=location, method=method, latency=latency, ok=False)
+            msg = f"API Error: {e}"
+            if e.response is not None: msg += f"\nBody: {e.response.text}"
+            raise VertexAPIError(msg, e.response) from e
+        except Exception:
+            # 回调或解析出错不能说明 endpoint 状态，只释放半开状态的试探名额
+            BREAKER.release_probe(breaker_key)
+            raise
+
+        latency = time.time() - start
+        # 熔断只看首个响应的耗时，完整生成 (如 4K 图片) 和预览解码的时间不计入
+        time_to_first = first_chunk if first_chunk is not None else response.elapsed.total_seconds()
+        BREAKER.record_success(breaker_key, time_to_first)
+
+        if not stream:
+            try:
+                result_list = response.json()
+                if isinstance(result_list, dict): # 兼容非流式接口返回
+                    result_list = [result_list]
+            except ValueError:
+                # 尝试解析多行 JSON
+                result_list = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+            if on_chunk:
+                for result in result_list:
+                    on_chunk(result)
+
+        if CASSETTE_MODE == "record":
+            CASSETTE.save(cassette_key, result_list)
+
+        LEDGER.record(model=model, location=location, method=method, latency=latency, ok=True, **extract_usage(result_list))
+        return result_list
@@ -0,0 +1,41 @@
+import os
+import json
+import time
+import base64
+
+from encoding import encode_body, HAS_ORJSON
+
+# 每张参考图约 1MB (1K JPEG 的典型大小)
+IMAGE_BYTES = 1024 * 1024
+REPEAT = 5
+
+
+def build_payload(num_images):
+    # 随机字节模拟 JPEG，压缩率与真实图片接近
+    parts = [{"text": "A cinematic shot of a cyberpunk detective"}]
+    for _ in range(num_images):
+        parts.append({"inlineData": {"mimeType": "image/jpeg", "data": base64.b64encode(os.urandom(IMAGE_BYTES)).decode("utf-8")}})
+    return {
+        "contents": [{"role": "user", "parts": parts}],
+        "generationConfig": {"temperature": 1.0, "responseModalities": ["TEXT", "IMAGE"]},
+    }
+
+
+def bench(func):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = func()
+    return (time.perf_counter() - start) / REPEAT * 1000, result
+
+
+if __name__ == "__main__":
+    print(f"orjson available: {HAS_ORJSON}")
+    print(f"{'images':>6} {'stdlib_ms':>10} {'stream_ms':>10} {'gzip_ms':>10} {'raw_MB':>8} {'gzip_MB':>8}")
+    for num_images in (1, 2, 4, 8, 16):
+        payload = build_payload(num_images)
+        # requests.post(json=payload) 的做法
+        stdlib_ms, stdlib_body = bench(lambda: json.dumps(payload).encode("utf-8"))
+        stream_ms, (raw_body, _) = bench(lambda: encode_body(payload, compression="off"))
+        gzip_ms, (gzip_body, _) = bench(lambda: encode_body(payload, compression="gzip"))
+        assert json.loads(raw_body) == payload
+        print(f"{num_images:>6} {stdlib_ms:>10.1f} {stream_ms:>10.1f} {gzip_ms:>10.1f} {len(raw_body) / 1e6:>8.2f} {len(gzip_body) / 1e6:>8.2f}")
@@ -0,0 +1,90 @@
+import os
+import json
+import base64
+import hashlib
+from .encoding import iter_json_chunks
+
+# 录制/回放模式: off / record / replay
+CASSETTE_MODE = os.environ.get("VERTEX_CASSETTE_MODE", "off").lower()
+
+
+class CassetteMiss(Exception):
+    """回放模式下请求没有对应的录制"""
+    pass
+
+
+def get_cassette_dir():
+    """获取 cassette 文件夹路径 (可通过 VERTEX_CASSETTE_DIR 指定)"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    cassette_dir = os.environ.get("VERTEX_CASSETTE_DIR") or os.path.join(current_dir, "cassettes")
+    if not os.path.exists(cassette_dir):
+        os.makedirs(cassette_dir)
+    return cassette_dir
+
+
+class Cassette:
+    """
+    请求/响应录制与回放
+    每个请求按 (URL 去掉 query, payload) 的 hash 存为 <hash>.json，
+    响应中的图片解码后以二进制 blob 单独存储，相同图片只保存一次
+    """
+    def __init__(self, cassette_dir=None):
+        self.cassette_dir = cassette_dir or get_cassette_dir()
+        self.blob_dir = os.path.join(self.cassette_dir, "blobs")
+
+    def request_key(self, url, payload):
+        # 去掉 URL 中的 ?key=，避免 API Key 影响匹配或写入磁盘
+        digest = hashlib.sha256((url.split("?")[0] + "\n").encode("utf-8"))
+        for chunk in iter_json_chunks(payload):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def save(self, key, result_list):
+        chunks = []
+        for result in result_list:
+            result = json.loads(json.dumps(result))
+            for candidate in result.get("candidates", []):
+                for part in candidate.get("content", {}).get("parts", []):
+                    inline = part.get("inlineData")
+                    if inline and inline.get("data"):
+                        inline["blob"] = self._put_blob(inline.pop("data"))
+            chunks.append(result)
+
+        path = os.path.join(self.cassette_dir, f"{key}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(chunks, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def load(self, key):
+        """读取录制的响应，未录制时返回 None"""
+        path = os.path.join(self.cassette_dir, f"{key}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+        for result in chunks:
+            for candidate in result.get("candidates", []):
+                for part in candidate.get("content", {}).get("parts", []):
+                    inline = part.get("inlineData")
+                    if inline and "blob" in inline:
+                        inline["data"] = self._get_blob(inline.pop("blob"))
+        return chunks
+
+    def _put_blob(self, b64_data):
+        raw = base64.b64decode(b64_data)
+        digest = hashlib.sha256(raw).hexdigest()
+        blob_path = os.path.join(self.blob_dir, digest)
+        if not os.path.exists(blob_path):
+            if not os.path.exists(self.blob_dir):
+                os.makedirs(self.blob_dir)
+            with open(blob_path, "wb") as f:
+                f.write(raw)
+        return digest
+
+    def _get_blob(self, digest):
+        with open(os.path.join(self.blob_dir, digest), "rb") as f:
+            return base64.b64encode(f.read()).decode("utf-8")
+
+
+# 只在启用时创建 cassette 目录
+CASSETTE = Cassette() if CASSETTE_MODE in ("record", "replay") else None
@@ -0,0 +1,98 @@
+from PIL import Image
+from .base import VertexBase
+from .utils import CACHED_MODELS, tensor_to_base64, unify_image_batch
+from .session_store import ChatSessionStore
+
+class VertexGeminiChatSession(VertexBase):
+    """
+    【多轮对话节点】
+    保存对话历史 (包括生成的图片和 thought signature)，支持迭代式编辑
+    历史中的图片按 hash 引用存储在磁盘上，旧的对话轮次会被压缩为摘要
+    """
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "vertex_config": ("VERTEX_CONFIG",),
+                "session_id": ("STRING", {"default": "default"}),
+                "prompt": ("STRING", {"multiline": True, "default": "Make the sky more dramatic"}),
+                "model_name": (CACHED_MODELS, {"default": "gemini-3-pro-image-preview"}),
+                "aspect_ratio": (["1:1", "16:9", "9:16", "4:3", "3:4", "21:9"], {"default": "1:1"}),
+                "output_resolution": (["1K", "2K", "4K"], {"default": "1K"}),
+                "max_turns": ("INT", {"default": 6, "min": 1, "max": 100}),
+            },
+            "optional": {
+                "image_input": ("IMAGE",),
+                "generation_config": ("GENERATION_CONFIG",),
+                "reset_session": ("BOOLEAN", {"default": False}),
+                "custom_model_name": ("STRING", {"default": "", "placeholder": "Override model name manually"}),
+                "batch_mode": (["resize", "pad", "crop"], {"default": "resize"}),
+            }
+        }
+
+    RETURN_TYPES = ("IMAGE", "STRING", "STRING")
+    RETURN_NAMES = ("image", "text", "session_id")
+    FUNCTION = "chat"
+    CATEGORY = "VertexAI"
+
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        # 对话历史保存在磁盘上，每次都需要重新执行
+        return float("nan")
+
+    def chat(self, vertex_config, session_id, prompt, model_name, aspect_ratio, output_resolution, max_turns, image_input=None, generation_config=None, reset_session=False, custom_model_name="", batch_mode="resize"):
+
+        target_model = custom_model_name if custom_model_name.strip() else model_name
+        url, headers = self.resolve_endpoint(vertex_config, target_model)
+
+        # 1. 加载会话历史
+        store = ChatSessionStore(session_id)
+        if reset_session:
+            store.reset()
+
+        # 2. 构建本轮用户消息
+        user_parts = [{"text": prompt}]
+        if image_input is not None:
+            for i in range(image_input.shape[0]):
+                b64_img, mime_type = tensor_to_base64(image_input[i])
+                user_parts.append({"inlineData": {"mimeType": mime_type, "data": b64_img}})
+
+        contents = store.build_contents() + [{"role": "user", "parts": user_parts}]
+        image_config = {"aspectRatio": aspect_ratio, "imageSize": output_resolution}
+        payload, _ = self.build_payload(contents, generation_config, image_config)
+
+        print(f"VertexAI Chat Request to: {target_model} (session {store.session_id}, {len(store.turns) // 2} previous turns)")
+        result_list = self.post_generate(url, headers, payload)
+
+        # 3. 解析结果，合并流式返回的文本片段
+        model_parts = []
+        output_images = []
+        output_text = ""
+        for result in result_list:
+            candidates = result.get('candidates', [])
+            if not candidates: continue
+
+            for part in candidates[0].get('content', {}).get('parts', []):
+                img_tensor = self.decode_image_part(part)
+                if img_tensor is not None:
+                    output_images.append(img_tensor)
+                elif 'text' in part and not part.get('thought'):
+                    output_text += part['text']
+
+                if model_parts and set(part) == {"text"} and set(model_parts[-1]) == {"text"}:
+                    model_parts[-1] = {"text": model_parts[-1]["text"] + part["text"]}
+                else:
+                    model_parts.append(part)
+
+        # 4. 保存历史 (图片以 hash 引用)，并裁剪旧的对话轮次
+        # 响应被拦截或没有内容时不保存本轮
+        if store.append_exchange(user_parts, model_parts):
+            store.trim(max_turns)
+            store.save()
+        else:
+            print(f"Warning: Empty model response, turn not saved to session {store.session_id}")
+
+        if not output_images:
+            output_images.append(self.pil2tensor(Image.new('RGB', (512, 512), color='black')))
+
+        return (unify_image_batch(output_images, batch_mode), output_text, store.session_id)
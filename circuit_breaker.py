@@ -0,0 +1,119 @@
+import os
+import time
+import threading
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """endpoint 熔断中，请求被直接拒绝"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    按 (location, model) 区分的熔断器
+    - 连续失败或首个响应过慢 (slow_seconds) 达到阈值后打开，打开期间请求直接失败
+    - 冷却时间过后进入半开状态，只放行一个试探请求，成功则关闭，失败则重新打开
+    """
+    def __init__(self, failure_threshold=3, cooldown=60.0, slow_seconds=90.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slow_seconds = slow_seconds
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def _get(self, key):
+        if key not in self._states:
+            self._states[key] = {"state": CLOSED, "failures": 0, "opened_at": 0.0, "probing": False, "last_error": "", "last_latency": 0.0}
+        return self._states[key]
+
+    def is_available(self, key):
+        """endpoint 当前是否可以接收请求 (不改变状态)"""
+        with self._lock:
+            entry = self._get(key)
+            if entry["state"] == CLOSED:
+                return True
+            if entry["state"] == OPEN:
+                return time.time() - entry["opened_at"] >= self.cooldown
+            return not entry["probing"]
+
+    def before_request(self, key):
+        """请求前检查，熔断打开时抛出 CircuitOpenError"""
+        with self._lock:
+            entry = self._get(key)
+            if entry["state"] == OPEN:
+                remaining = self.cooldown - (time.time() - entry["opened_at"])
+                if remaining > 0:
+                    raise CircuitOpenError(f"Vertex AI endpoint {key[0]}/{key[1]} is unavailable (circuit open, retry in {remaining:.0f}s). Last error: {entry['last_error']}")
+                entry["state"] = HALF_OPEN
+            if entry["state"] == HALF_OPEN:
+                if entry["probing"]:
+                    raise CircuitOpenError(f"Vertex AI endpoint {key[0]}/{key[1]} is being probed, request rejected")
+                entry["probing"] = True
+
+    def record_success(self, key, latency):
+        """latency 为首个响应 (响应头或首个 SSE chunk) 的耗时"""
+        with self._lock:
+            entry = self._get(key)
+            entry["last_latency"] = latency
+            entry["probing"] = False
+            if latency > self.slow_seconds:
+                self._fail(entry, f"slow first response ({latency:.1f}s)")
+                return
+            entry["state"] = CLOSED
+            entry["failures"] = 0
+
+    def release_probe(self, key):
+        """释放半开状态的试探名额，不改变熔断状态"""
+        with self._lock:
+            self._get(key)["probing"] = False
+
+    def record_failure(self, key, error):
+        with self._lock:
+            entry = self._get(key)
+            entry["probing"] = False
+            self._fail(entry, str(error)[:200])
+
+    def _fail(self, entry, error):
+        entry["failures"] += 1
+        entry["last_error"] = error
+        if entry["state"] == HALF_OPEN or entry["failures"] >= self.failure_threshold:
+            entry["state"] = OPEN
+            entry["opened_at"] = time.time()
+
+    def select_endpoint(self, url, location, model, fallbacks):
+        """当前区域熔断时，切换到第一个可用的备用区域，返回 (url, location)"""
+        if location == "global" or self.is_available((location, model)):
+            return url, location
+        for fallback in fallbacks:
+            if fallback != location and self.is_available((fallback, model)):
+                print(f"VertexAI: {location}/{model} circuit open, rerouting to {fallback}")
+                url = url.replace(f"//{location}-aiplatform", f"//{fallback}-aiplatform").replace(f"/locations/{location}/", f"/locations/{fallback}/")
+                return url, fallback
+        return url, location
+
+    def status(self):
+        with self._lock:
+            return {f"{location}/{model}": dict(entry) for (location, model), entry in self._states.items()}
+
+
+def is_endpoint_failure(error):
+    """只有超时、连接错误、429 和 5xx 算作 endpoint 故障，其余 4xx 是请求本身的问题"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return True
+    return response.status_code == 429 or response.status_code >= 500
+
+
+# 全局熔断器实例，阈值可通过环境变量配置
+BREAKER = CircuitBreaker(
+    failure_threshold=int(os.environ.get("VERTEX_BREAKER_FAILURES", "3")),
+    cooldown=float(os.environ.get("VERTEX_BREAKER_COOLDOWN", "60")),
+    slow_seconds=float(os.environ.get("VERTEX_BREAKER_SLOW_SECONDS", "90")),
+)
+
+# 熔断时可切换的备用区域 (逗号分隔)，只对 Service Account 方式的区域 endpoint 生效
+FALLBACK_LOCATIONS = [loc.strip() for loc in os.environ.get("VERTEX_FALLBACK_LOCATIONS", "").split(",") if loc.strip()]
@@ -0,0 +1,75 @@
+import os
+import re
+import zlib
+import uuid
+import json
+
+# 尝试导入更快的 JSON 库
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# 请求体压缩: off / gzip
+REQUEST_COMPRESSION = os.environ.get("VERTEX_REQUEST_COMPRESSION", "off").lower()
+GZIP_LEVEL = int(os.environ.get("VERTEX_GZIP_LEVEL", "1"))
+
+_BLOB_NONCE = uuid.uuid4().hex
+_BLOB_PATTERN = re.compile(rb"__VERTEX_BLOB_(\d+)_" + _BLOB_NONCE.encode("ascii") + rb"__")
+
+
+def _strip_blobs(obj, blobs):
+    """复制 payload 的容器结构，把 inlineData.data 替换为占位符，base64 字符串本身不复制"""
+    if isinstance(obj, dict):
+        stripped = {}
+        for key, value in obj.items():
+            if key == "inlineData" and isinstance(value, dict) and isinstance(value.get("data"), str):
+                value = dict(value)
+                value["data"] = f"__VERTEX_BLOB_{len(blobs)}_{_BLOB_NONCE}__"
+                blobs.append(obj[key]["data"])
+            else:
+                value = _strip_blobs(value, blobs)
+            stripped[key] = value
+        return stripped
+    if isinstance(obj, list):
+        return [_strip_blobs(item, blobs) for item in obj]
+    return obj
+
+
+def _dumps(obj):
+    if HAS_ORJSON:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def iter_json_chunks(payload):
+    """
+    分段生成 payload 的 JSON 字节
+    只序列化不含图片的骨架，base64 数据 (不需要转义) 直接拼接，不再重新序列化
+    """
+    blobs = []
+    skeleton = _dumps(_strip_blobs(payload, blobs))
+    pieces = _BLOB_PATTERN.split(skeleton)
+    # split 结果为 [text, index, text, index, ..., text]
+    for i, piece in enumerate(pieces):
+        if i % 2 == 0:
+            if piece:
+                yield piece
+        else:
+            yield blobs[int(piece)].encode("ascii")
+
+
+def encode_body(payload, compression=None):
+    """
+    将 payload 编码为请求体，开启 gzip 时逐段压缩
+    Returns: (body, extra_headers)
+    """
+    compression = REQUEST_COMPRESSION if compression is None else compression
+    if compression != "gzip":
+        return b"".join(iter_json_chunks(payload)), {}
+
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    compressed = [compressor.compress(chunk) for chunk in iter_json_chunks(payload)]
+    compressed.append(compressor.flush())
+    return b"".join(compressed), {"Content-Encoding": "gzip"}
@@ -0,0 +1,170 @@
+"""
+Vertex AI 调用用量账本
+
+每次调用追加一行 JSON 到 usage/usage.jsonl，由后台线程写入，不阻塞生成流程。
+文件超过大小上限后自动轮转。
+
+命令行汇总:
+    python ledger.py --days 7
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import argparse
+import threading
+from collections import defaultdict
+
+MAX_LEDGER_BYTES = 10 * 1024 * 1024
+MAX_ROTATED_FILES = 20
+
+
+def get_usage_dir():
+    """获取用量账本文件夹路径"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    usage_dir = os.path.join(current_dir, "usage")
+    if not os.path.exists(usage_dir):
+        os.makedirs(usage_dir)
+    return usage_dir
+
+
+def extract_usage(result_list):
+    """从响应列表中提取 token 用量和图片数量 (流式响应的用量在最后一个 chunk 中)"""
+    usage = {}
+    images = 0
+    for result in result_list:
+        usage = result.get("usageMetadata") or usage
+        for candidate in result.get("candidates", []):
+            images += sum(1 for part in candidate.get("content", {}).get("parts", []) if "inlineData" in part)
+    return {
+        "input_tokens": usage.get("promptTokenCount", 0),
+        "output_tokens": usage.get("candidatesTokenCount", 0) + usage.get("thoughtsTokenCount", 0),
+        "cached_tokens": usage.get("cachedContentTokenCount", 0),
+        "images": images,
+    }
+
+
+class UsageLedger:
+    """追加写入的 JSONL 账本，写入在后台线程中完成"""
+    def __init__(self, usage_dir=None):
+        self.usage_dir = usage_dir or get_usage_dir()
+        self.path = os.path.join(self.usage_dir, "usage.jsonl")
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def record(self, **entry):
+        """记录一次调用，立即返回"""
+        entry.setdefault("ts", time.time())
+        self._queue.put(entry)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._writer, name="VertexUsageLedger", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+
+    def flush(self):
+        """等待队列中的记录全部写入"""
+        self._queue.join()
+
+    def _writer(self):
+        while True:
+            entries = [self._queue.get()]
+            # 批量取出已排队的记录，一次写入
+            while True:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._rotate_if_needed()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for entry in entries:
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except Exception as e:
+                print(f"Vertex AI: Failed to write usage ledger: {e}")
+            finally:
+                for _ in entries:
+                    self._queue.task_done()
+
+    def _rotate_if_needed(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < MAX_LEDGER_BYTES:
+            return
+        os.replace(self.path, os.path.join(self.usage_dir, f"usage-{int(time.time())}.jsonl"))
+        rotated = sorted(f for f in os.listdir(self.usage_dir) if f.startswith("usage-") and f.endswith(".jsonl"))
+        for name in rotated[:-MAX_ROTATED_FILES]:
+            os.remove(os.path.join(self.usage_dir, name))
+
+    def iter_entries(self, since=0):
+        """按时间顺序遍历所有账本记录 (包括已轮转的文件)"""
+        files = sorted(f for f in os.listdir(self.usage_dir) if f.startswith("usage-") and f.endswith(".jsonl"))
+        files.append("usage.jsonl")
+        for name in files:
+            path = os.path.join(self.usage_dir, name)
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get("ts", 0) >= since:
+                        yield entry
+
+    def load_prices(self):
+        """
+        读取 usage/prices.json 中的价格表 (可选)，格式:
+        {"model": {"input_per_million": 1.25, "output_per_million": 10.0, "per_image": 0.04}}
+        """
+        path = os.path.join(self.usage_dir, "prices.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def summarize(self, days=7):
+        """
+        按 日期 + 模型 汇总调用次数、延迟、token、图片数和费用
+        countTokens 调用单独汇总为 "<model> (countTokens)"，不计入生成调用
+        """
+        since = time.time() - days * 86400 if days > 0 else 0
+        prices = self.load_prices()
+        rows = defaultdict(lambda: defaultdict(float))
+        for entry in self.iter_entries(since):
+            day = time.strftime("%Y-%m-%d", time.localtime(entry["ts"]))
+            model = entry.get("model", "unknown")
+            if entry.get("method") == "countTokens":
+                model += " (countTokens)"
+            row = rows[(day, model)]
+            row["calls"] += 1
+            row["errors"] += 0 if entry.get("ok", True) else 1
+            row["latency"] += entry.get("latency", 0)
+            row["cache_hits"] += 1 if entry.get("cache_hit") or entry.get("cached_tokens") else 0
+            for key in ("input_tokens", "output_tokens", "images"):
+                row[key] += entry.get(key, 0)
+
+        lines = [f"{'day':<10}  {'model':<32} {'calls':>6} {'err':>4} {'avg_s':>6} {'in_tok':>10} {'out_tok':>10} {'imgs':>5} {'cache':>5} {'cost':>8}"]
+        for (day, model), row in sorted(rows.items()):
+            price = prices.get(model)
+            cost = "-"
+            if price:
+                cost = "%.4f" % (row["input_tokens"] / 1e6 * price.get("input_per_million", 0)
+                                 + row["output_tokens"] / 1e6 * price.get("output_per_million", 0)
+                                 + row["images"] * price.get("per_image", 0))
+            lines.append(f"{day:<10}  {model:<32} {int(row['calls']):>6} {int(row['errors']):>4} {row['latency'] / row['calls']:>6.1f} "
+                         f"{int(row['input_tokens']):>10} {int(row['output_tokens']):>10} {int(row['images']):>5} {int(row['cache_hits']):>5} {cost:>8}")
+        return "\n".join(lines)
+
+
+# 全局账本实例
+LEDGER = UsageLedger()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize Vertex AI usage per model and per day")
+    parser.add_argument("--days", type=int, default=7, help="Number of days to include, 0 = all")
+    args = parser.parse_args()
+    print(LEDGER.summarize(args.days))
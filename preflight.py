@@ -0,0 +1,107 @@
+import math
+import hashlib
+
+# Gemini 对图片的计费方式：两边都不超过 384 时按 258 token 计，否则按 768x768 切片，每片 258 token
+IMAGE_TOKENS_PER_TILE = 258
+IMAGE_SMALL_SIDE = 384
+IMAGE_TILE_SIZE = 768
+
+# countTokens 结果缓存 (payload hash -> totalTokens)
+_COUNT_TOKENS_CACHE = {}
+
+
+def estimate_text_tokens(text):
+    """粗略估算文本 token 数 (约 4 个字符 1 个 token)"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / 4)
+
+
+def estimate_image_tokens(height, width):
+    """按 Gemini 的切片规则估算单张图片的 token 数"""
+    if height <= IMAGE_SMALL_SIDE and width <= IMAGE_SMALL_SIDE:
+        return IMAGE_TOKENS_PER_TILE
+    tiles = math.ceil(height / IMAGE_TILE_SIZE) * math.ceil(width / IMAGE_TILE_SIZE)
+    return tiles * IMAGE_TOKENS_PER_TILE
+
+
+def estimate_request_tokens(text, image_sizes):
+    """估算一次请求的输入 token 数，image_sizes 为 [(H, W), ...]"""
+    return estimate_text_tokens(text) + sum(estimate_image_tokens(h, w) for h, w in image_sizes)
+
+
+def plan_image_sizes(text, image_sizes, budget):
+    """
+    只根据尺寸计算满足预算的方案：先逐步将最大的图片边长减半，直到满足预算或所有图片都只占一个切片，
+    仍然超出预算则从末尾丢弃图片
+    Returns: (target_sizes, estimated_tokens)，target_sizes 的长度即保留的图片数
+    """
+    sizes = list(image_sizes)
+    if budget <= 0:
+        return sizes, estimate_request_tokens(text, sizes)
+
+    # 1. 逐步将最大的图片边长减半
+    while estimate_request_tokens(text, sizes) > budget:
+        largest = max(range(len(sizes)), key=lambda i: estimate_image_tokens(*sizes[i]), default=None)
+        if largest is None or estimate_image_tokens(*sizes[largest]) <= IMAGE_TOKENS_PER_TILE:
+            break
+        h, w = sizes[largest]
+        sizes[largest] = (max(1, h // 2), max(1, w // 2))
+
+    # 2. 仍然超出预算则从末尾丢弃图片
+    while sizes and estimate_request_tokens(text, sizes) > budget:
+        sizes.pop()
+    return sizes, estimate_request_tokens(text, sizes)
+
+
+def fit_images_to_budget(text, images, budget):
+    """
+    在本地估算 token，超出预算时先缩小参考图，仍超出则从末尾丢弃图片。
+    只根据尺寸计算，不做编码，最后每张保留的图片最多缩放一次。
+    images: [H, W, C] tensor 列表
+    Returns: (images, estimated_tokens, actions)
+    """
+    sizes, tokens = plan_image_sizes(text, [(img.shape[0], img.shape[1]) for img in images], budget)
+    actions = []
+
+    resized = []
+    for img, (h, w) in zip(images, sizes):
+        if (h, w) != (img.shape[0], img.shape[1]):
+            actions.append(f"downscaled {img.shape[1]}x{img.shape[0]} -> {w}x{h}")
+            img = resize_image_tensor(img, h, w)
+        resized.append(img)
+    actions.extend(["dropped reference image"] * (len(images) - len(sizes)))
+
+    return resized, tokens, actions
+
+
+def resize_image_tensor(image_tensor, height, width):
+    """缩放单张 [H, W, C] 图片 tensor"""
+    import torch.nn.functional as F
+    resized = F.interpolate(image_tensor.movedim(-1, 0).unsqueeze(0), size=(height, width), mode="bilinear", align_corners=False, antialias=True)
+    return resized.squeeze(0).movedim(0, -1).clamp(0.0, 1.0)
+
+
+def count_tokens(node, url, headers, payload, timeout=30, priority="interactive"):
+    """
+    调用 :countTokens 接口获取准确的 token 数，结果按 payload hash 缓存
+    请求经过 node.post_generate，与生成请求共用调度、熔断、账本和编码，
+    priority 与调用方的生成请求一致
+    """
+    from .encoding import iter_json_chunks
+    body = {"contents": payload["contents"]}
+    if "systemInstruction" in payload:
+        body["systemInstruction"] = payload["systemInstruction"]
+
+    # 直接对编码后的分段计算 hash，不重新序列化 base64 数据
+    digest = hashlib.sha256((url.split("?")[0] + "\n").encode("utf-8"))
+    for chunk in iter_json_chunks(body):
+        digest.update(chunk)
+    digest = digest.hexdigest()
+    if digest in _COUNT_TOKENS_CACHE:
+        return _COUNT_TOKENS_CACHE[digest]
+
+    result_list = node.post_generate(url, headers, body, timeout=timeout, priority=priority)
+    total = result_list[0].get("totalTokens", 0) if result_list else 0
+    _COUNT_TOKENS_CACHE[digest] = total
+    return total
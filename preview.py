@@ -0,0 +1,35 @@
+class PreviewReporter:
+    """
+    在生成过程中把已解码的图片和文本推送到 ComfyUI 的预览/进度通道
+    不在 ComfyUI 环境中运行时所有方法都是空操作
+    """
+    def __init__(self, unique_id=None, max_preview_size=1024):
+        self.unique_id = unique_id
+        self.max_preview_size = max_preview_size
+        self.images = 0
+        self.text = ""
+        try:
+            import comfy.utils
+            self.pbar = comfy.utils.ProgressBar(1)
+        except ImportError:
+            self.pbar = None
+        try:
+            from server import PromptServer
+            self.server = PromptServer.instance
+        except ImportError:
+            self.server = None
+
+    def image(self, pil_image):
+        self.images += 1
+        if self.pbar is not None:
+            self.pbar.update_absolute(0, 1, ("PNG", pil_image, self.max_preview_size))
+
+    def add_text(self, text):
+        self.text += text
+        # 较新版本的 ComfyUI 支持在节点上显示进度文本
+        if self.server is not None and self.unique_id is not None and hasattr(self.server, "send_progress_text"):
+            self.server.send_progress_text(self.text, self.unique_id)
+
+    def finish(self):
+        if self.pbar is not None:
+            self.pbar.update_absolute(1, 1)
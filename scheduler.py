@@ -0,0 +1,160 @@
+import os
+import itertools
+import threading
+from contextlib import contextmanager
+
+# 优先级类别，数值越小越优先
+PRIORITY_CLASSES = {"interactive": 0, "batch": 1}
+
+
+# 带有 priority 输入的节点，以及未设置时的默认优先级
+PRIORITY_NODE_DEFAULTS = {
+    "VertexGeminiImageGenerator": "interactive",
+    "VertexGeminiTextGenerator": "interactive",
+    "VertexPromptSweep": "batch",
+}
+
+# ComfyUI 队列按 number 从小到大执行，batch 工作流整体排在已排队的 interactive 之后，
+# 同一类别内按客户端轮次交错，轮次相同时保持提交顺序。
+# 只影响尚未开始的队列项，正在执行的工作流不会被打断
+BATCH_NUMBER_OFFSET = 10 ** 15
+ROUND_NUMBER_STRIDE = 10 ** 9
+
+
+def current_workflow_id():
+    """
+    获取调用方正在执行的 ComfyUI prompt id (执行上下文按线程区分，不是进程级全局值)
+    不在 ComfyUI 执行上下文中调用时返回 None
+    """
+    try:
+        from comfy_execution.utils import get_executing_context
+    except ImportError:
+        return None
+    context = get_executing_context()
+    return context.prompt_id if context is not None else None
+
+
+def prompt_priority(prompt):
+    """根据 prompt 中 Vertex 节点的 priority 输入判断整个工作流的优先级类别"""
+    for node in prompt.values():
+        default = PRIORITY_NODE_DEFAULTS.get(node.get("class_type"))
+        if default and node.get("inputs", {}).get("priority", default) == "batch":
+            return "batch"
+    return "interactive"
+
+
+def prompt_queue_number(queued_items, item):
+    """
+    计算新提交的 ComfyUI 队列项的排序号
+    item 为 (number, prompt_id, prompt, extra_data, ...)，queued_items 为当前队列中的项
+    - 通过 "front" 提交的项 (number < 0) 保持不变
+    - interactive 工作流保持原有排序号，始终先于 batch 执行
+    - batch 工作流的轮次比该客户端队列中最大的轮次大 1，同一客户端保持提交顺序，
+      不同客户端的 batch 任务轮流执行
+    """
+    number, prompt = item[0], item[2]
+    if number < 0 or prompt_priority(prompt) != "batch":
+        return number
+    client_id = (item[3] or {}).get("client_id")
+    rounds = [(queued[0] - BATCH_NUMBER_OFFSET) // ROUND_NUMBER_STRIDE for queued in queued_items
+              if queued[0] >= BATCH_NUMBER_OFFSET and (queued[3] or {}).get("client_id") == client_id]
+    next_round = max(rounds) + 1 if rounds else 0
+    return BATCH_NUMBER_OFFSET + next_round * ROUND_NUMBER_STRIDE + number
+
+
+def install_prompt_queue_priority():
+    """
+    替换 ComfyUI PromptQueue.put，提交时按优先级类别和客户端重新计算排序号
+    ComfyUI 同一时间只执行一个 prompt，真正排队的地方是 prompt 队列
+    """
+    try:
+        import execution
+    except ImportError:
+        return
+    queue_class = execution.PromptQueue
+    if getattr(queue_class, "_vertex_priority_installed", False):
+        return
+    original_put = queue_class.put
+
+    def put(self, item):
+        number = prompt_queue_number(list(self.queue), item)
+        if number != item[0]:
+            item = (number,) + tuple(item[1:])
+        original_put(self, item)
+
+    queue_class.put = put
+    queue_class._vertex_priority_installed = True
+
+
+class RequestScheduler:
+    """
+    进程内的 Vertex 请求调度器
+    只在同一进程中有多个线程同时发送请求时起作用 (例如自定义的并发调用)；
+    ComfyUI 默认一次只执行一个 prompt，工作流之间的优先级由 install_prompt_queue_priority 处理
+    - 按优先级类别排队，interactive 请求总是先于 batch 请求
+    - 每个类别有独立的并发上限，batch 默认保留一个并发给 interactive
+    - 同一类别内按各工作流已获得的请求数公平轮转，避免大批量任务饿死其他工作流
+    """
+    def __init__(self, max_concurrency=4, class_limits=None):
+        self.max_concurrency = max_concurrency
+        self.class_limits = class_limits or {
+            "interactive": max_concurrency,
+            "batch": max(1, max_concurrency - 1),
+        }
+        self._cond = threading.Condition()
+        self._active = {name: 0 for name in PRIORITY_CLASSES}
+        self._waiting = []
+        self._served = {}
+        self._seq = itertools.count()
+
+    @contextmanager
+    def slot(self, priority="interactive", workflow_id=None):
+        """获取一个请求并发槽，离开 with 块时释放"""
+        if priority not in PRIORITY_CLASSES:
+            priority = "interactive"
+        workflow_id = workflow_id or "default"
+        ticket = (priority, workflow_id, next(self._seq))
+
+        with self._cond:
+            self._waiting.append(ticket)
+            while self._next_ticket() != ticket:
+                self._cond.wait()
+            self._waiting.remove(ticket)
+            self._active[priority] += 1
+            self._served[workflow_id] = self._served.get(workflow_id, 0) + 1
+            # 后面的请求可能属于其他仍有空闲并发的类别
+            self._cond.notify_all()
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active[priority] -= 1
+                # 已无排队请求的工作流不再参与公平计数
+                if not any(t[1] == workflow_id for t in self._waiting):
+                    self._served.pop(workflow_id, None)
+                self._cond.notify_all()
+
+    def _next_ticket(self):
+        """选出下一个可以执行的请求：优先级 -> 工作流已服务次数 -> 到达顺序"""
+        if sum(self._active.values()) >= self.max_concurrency:
+            return None
+        runnable = [t for t in self._waiting if self._active[t[0]] < self.class_limits.get(t[0], self.max_concurrency)]
+        if not runnable:
+            return None
+        return min(runnable, key=lambda t: (PRIORITY_CLASSES[t[0]], self._served.get(t[1], 0), t[2]))
+
+    def status(self):
+        with self._cond:
+            return {
+                "active": dict(self._active),
+                "waiting": {name: sum(1 for t in self._waiting if t[0] == name) for name in PRIORITY_CLASSES},
+            }
+
+
+# 全局调度器实例，并发数可通过环境变量配置
+_MAX_CONCURRENCY = int(os.environ.get("VERTEX_MAX_CONCURRENCY", "4"))
+SCHEDULER = RequestScheduler(_MAX_CONCURRENCY, {
+    "interactive": _MAX_CONCURRENCY,
+    "batch": int(os.environ.get("VERTEX_BATCH_CONCURRENCY", str(max(1, _MAX_CONCURRENCY - 1)))),
+})
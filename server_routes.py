@@ -0,0 +1,15 @@
+from .circuit_breaker import BREAKER
+from .scheduler import SCHEDULER
+
+
+def register_routes():
+    """在 ComfyUI 服务器上注册 /vertex/status，返回熔断器和调度器状态"""
+    try:
+        from server import PromptServer
+        from aiohttp import web
+    except ImportError:
+        return
+
+    @PromptServer.instance.routes.get("/vertex/status")
+    async def vertex_status(request):
+        return web.json_response({"circuit_breakers": BREAKER.status(), "scheduler": SCHEDULER.status()})
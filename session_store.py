@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import base64
+import hashlib
+
+# 旧对话摘要的最大长度 (字符)
+MAX_SUMMARY_CHARS = 4000
+# 每条被裁剪的消息在摘要中保留的长度 (字符)
+SUMMARY_SNIPPET_CHARS = 200
+
+
+def get_sessions_dir():
+    """获取会话存储文件夹路径"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    sessions_dir = os.path.join(current_dir, "sessions")
+    if not os.path.exists(sessions_dir):
+        os.makedirs(sessions_dir)
+    return sessions_dir
+
+
+class ChatSessionStore:
+    """
+    多轮对话历史存储
+    历史记录保存在 sessions/<session_id>/history.json，
+    图片按内容 hash 存为 blobs/<sha256> 二进制文件，历史中只保留 blobRef 引用
+    """
+    def __init__(self, session_id):
+        # 只保留安全字符，且不能以 "." 开头 ("." / ".." 会指向上级目录)，避免路径穿越
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", session_id.strip())
+        self.session_id = re.sub(r"^\.", "_", safe_id) or "default"
+        self.session_dir = os.path.join(get_sessions_dir(), self.session_id)
+        self.blob_dir = os.path.join(self.session_dir, "blobs")
+        self.history_path = os.path.join(self.session_dir, "history.json")
+        self.summary = ""
+        self.turns = []
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.history_path):
+            with open(self.history_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.summary = data.get("summary", "")
+            self.turns = data.get("turns", [])
+
+    def save(self):
+        if not os.path.exists(self.session_dir):
+            os.makedirs(self.session_dir)
+        # 先写临时文件再替换，避免中途崩溃损坏历史
+        tmp_path = self.history_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary, "turns": self.turns}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.history_path)
+
+    def reset(self):
+        self.summary = ""
+        self.turns = []
+        if os.path.isdir(self.blob_dir):
+            for name in os.listdir(self.blob_dir):
+                os.remove(os.path.join(self.blob_dir, name))
+        self.save()
+
+    def put_blob(self, b64_data):
+        """保存 base64 图片数据，返回内容 hash (相同图片只存一次)"""
+        raw = base64.b64decode(b64_data)
+        digest = hashlib.sha256(raw).hexdigest()
+        blob_path = os.path.join(self.blob_dir, digest)
+        if not os.path.exists(blob_path):
+            if not os.path.exists(self.blob_dir):
+                os.makedirs(self.blob_dir)
+            with open(blob_path, "wb") as f:
+                f.write(raw)
+        return digest
+
+    def get_blob(self, digest):
+        with open(os.path.join(self.blob_dir, digest), "rb") as f:
+            return base64.b64encode(f.read()).decode("utf-8")
+
+    def compact_parts(self, parts):
+        """将 inlineData 替换为 blobRef，丢弃没有签名的 thought 摘要 (带签名的保留 thought 标记)"""
+        compact = []
+        for part in parts:
+            if part.get("thought") and "thoughtSignature" not in part:
+                continue
+            part = dict(part)
+            inline = part.pop("inlineData", None)
+            if inline and inline.get("data"):
+                part["blobRef"] = {"sha256": self.put_blob(inline["data"]), "mimeType": inline.get("mimeType", "image/png")}
+            if part:
+                compact.append(part)
+        return compact
+
+    def append_exchange(self, user_parts, model_parts):
+        """
+        保存一问一答；model 没有可保存的内容时 (被拦截/无候选) 不保存并返回 False，
+        空的 model 消息会导致后续请求 400
+        """
+        model_parts = self.compact_parts(model_parts)
+        if not model_parts:
+            return False
+        self.turns.append({"role": "user", "parts": self.compact_parts(user_parts)})
+        self.turns.append({"role": "model", "parts": model_parts})
+        return True
+
+    def trim(self, max_turns):
+        """
+        只保留最近 max_turns 轮 (一问一答为一轮) 完整对话，
+        更早的对话压缩为纯文本摘要，图片不再发送
+        """
+        keep = max(1, max_turns) * 2
+        if len(self.turns) <= keep:
+            return
+        dropped, self.turns = self.turns[:-keep], self.turns[-keep:]
+        lines = []
+        for turn in dropped:
+            text = " ".join(p["text"] for p in turn["parts"] if "text" in p and not p.get("thought")).strip()
+            images = sum(1 for p in turn["parts"] if "blobRef" in p)
+            if images:
+                text += f" [{images} image(s)]"
+            lines.append(f"{turn['role']}: {text[:SUMMARY_SNIPPET_CHARS]}")
+        summary = "\n".join(filter(None, [self.summary] + lines))
+        self.summary = summary[-MAX_SUMMARY_CHARS:]
+        self.collect_blobs()
+
+    def collect_blobs(self):
+        """删除已不被任何保留轮次引用的图片 blob"""
+        if not os.path.isdir(self.blob_dir):
+            return
+        referenced = {p["blobRef"]["sha256"] for turn in self.turns for p in turn["parts"] if "blobRef" in p}
+        for name in os.listdir(self.blob_dir):
+            if name not in referenced:
+                os.remove(os.path.join(self.blob_dir, name))
+
+    def build_contents(self):
+        """将历史展开为请求用的 contents，blobRef 还原为 inlineData"""
+        contents = []
+        for turn in self.turns:
+            parts = []
+            for part in turn["parts"]:
+                part = dict(part)
+                ref = part.pop("blobRef", None)
+                if ref:
+                    part["inlineData"] = {"mimeType": ref["mimeType"], "data": self.get_blob(ref["sha256"])}
+                parts.append(part)
+            contents.append({"role": turn["role"], "parts": parts})
+
+        # 摘要拼接到第一条用户消息之前
+        if self.summary and contents:
+            contents[0]["parts"].insert(0, {"text": f"Summary of earlier conversation:\n{self.summary}"})
+        return contents
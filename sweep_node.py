@@ -0,0 +1,200 @@
+import os
+import csv
+import json
+import time
+import numpy as np
+from PIL import Image
+from .utils import CACHED_MODELS
+from .image_node import VertexGeminiImageGenerator
+from .base import VertexAPIError
+from .circuit_breaker import CircuitOpenError, is_endpoint_failure
+
+try:
+    import comfy.model_management as model_management
+except ImportError:
+    model_management = None
+
+ASPECT_RATIOS = ["1:1", "16:9", "9:16", "4:3", "3:4", "21:9"]
+RESOLUTIONS = ["1K", "2K", "4K"]
+
+
+def get_sweep_output_dir(output_dir):
+    """相对路径放在 ComfyUI 的 output 目录下，不在 ComfyUI 中运行时放在插件目录下"""
+    if os.path.isabs(output_dir):
+        base_dir = ""
+    else:
+        try:
+            import folder_paths
+            base_dir = folder_paths.get_output_directory()
+        except ImportError:
+            base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
+    path = os.path.join(base_dir, output_dir)
+    if not os.path.exists(path):
+        os.makedirs(path)
+    return path
+
+
+def iter_rows(file_path, start_row=0):
+    """
+    逐行读取 JSONL / CSV 文件，跳过 start_row 之前的行，不会一次性载入整个文件
+    JSONL 返回原始行文本，由 parse_row 在每行的错误处理中解析
+    """
+    with open(file_path, "r", encoding="utf-8", newline="") as f:
+        if file_path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (line for line in f if line.strip())
+        for index, row in enumerate(rows):
+            if index >= start_row:
+                yield index, row
+
+
+def is_endpoint_error(error):
+    """熔断、超时、连接错误、429 和 5xx 是 endpoint 的问题，与当前行无关"""
+    if isinstance(error, CircuitOpenError):
+        return True
+    return isinstance(error, VertexAPIError) and is_endpoint_failure(error)
+
+
+def parse_row(raw):
+    """将一行解析为 dict，格式错误时抛出 ValueError"""
+    row = json.loads(raw) if isinstance(raw, str) else raw
+    if not isinstance(row, dict):
+        raise ValueError(f"row is not an object: {type(row).__name__}")
+    return row
+
+
+class VertexPromptSweep:
+    """
+    【批量提示词节点】
+    从 JSONL / CSV 文件中逐行读取提示词并生成图片，每行可覆盖
+    prompt, negative_prompt, aspect_ratio, output_resolution
+    结果逐行写入磁盘，并记录进度，中断后重新运行会从上次停止的行继续
+    每次运行最多处理 max_rows 行，期间 ComfyUI 队列中的其他工作流可以先执行，再次排队即可继续
+    只有行本身的错误 (格式错误、没有返回图片、4xx) 会记为失败并跳过，
+    endpoint 故障 (熔断、超时、429、5xx) 会停止运行，该行留待下次重试
+    """
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "vertex_config": ("VERTEX_CONFIG",),
+                "file_path": ("STRING", {"default": "", "placeholder": "Path to .jsonl or .csv"}),
+                "model_name": (CACHED_MODELS, {"default": "gemini-3-pro-image-preview"}),
+                "aspect_ratio": (ASPECT_RATIOS, {"default": "1:1"}),
+                "output_resolution": (RESOLUTIONS, {"default": "1K"}),
+                "output_dir": ("STRING", {"default": "vertex_sweep"}),
+                "max_rows": ("INT", {"default": 50, "min": 0, "max": 10000000, "tooltip": "Rows to process per run, queue again to continue from the checkpoint. 0 = whole file (blocks the queue until done)"}),
+                "resume": ("BOOLEAN", {"default": True}),
+            },
+            "optional": {
+                "image_input": ("IMAGE",),
+                "generation_config": ("GENERATION_CONFIG",),
+                "negative_prompt": ("STRING", {"multiline": True, "default": ""}),
+                "custom_model_name": ("STRING", {"default": "", "placeholder": "Override model name manually"}),
+                "priority": (["interactive", "batch"], {"default": "batch"}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "INT")
+    RETURN_NAMES = ("output_dir", "completed")
+    FUNCTION = "sweep"
+    CATEGORY = "VertexAI"
+    OUTPUT_NODE = True
+
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        # 进度保存在磁盘上，每次都需要重新执行
+        return float("nan")
+
+    def sweep(self, vertex_config, file_path, model_name, aspect_ratio, output_resolution, output_dir, max_rows, resume, image_input=None, generation_config=None, negative_prompt="", custom_model_name="", priority="batch"):
+        if not os.path.isfile(file_path):
+            raise Exception(f"Vertex AI Sweep: prompt file not found: {file_path}")
+
+        output_path = get_sweep_output_dir(output_dir)
+        checkpoint_path = os.path.join(output_path, "checkpoint.json")
+        results_path = os.path.join(output_path, "results.jsonl")
+
+        # 1. 读取进度
+        checkpoint = {"file": os.path.abspath(file_path), "next_row": 0, "completed": 0, "failed": 0}
+        if resume and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("file") == checkpoint["file"]:
+                checkpoint = saved
+                print(f"Vertex AI Sweep: resuming from row {checkpoint['next_row']}")
+
+        generator = VertexGeminiImageGenerator()
+        processed = 0
+
+        # 2. 逐行生成，结果立即写入磁盘
+        for index, raw in iter_rows(file_path, checkpoint["next_row"]):
+            if max_rows and processed >= max_rows:
+                print(f"Vertex AI Sweep: processed {processed} rows, queue the workflow again to continue from row {index}")
+                break
+            # 响应 ComfyUI 的取消操作
+            if model_management is not None:
+                model_management.throw_exception_if_processing_interrupted()
+
+            record = {"row": index, "prompt": "", "files": []}
+            start = time.time()
+            try:
+                row = parse_row(raw)
+                prompt = row.get("prompt", "")
+                record["prompt"] = prompt
+                if not prompt:
+                    raise ValueError("empty prompt")
+                images, _, _, token_count = generator.generate_image(
+                    vertex_config=vertex_config,
+                    prompt=prompt,
+                    model_name=model_name,
+                    aspect_ratio=row.get("aspect_ratio") or aspect_ratio,
+                    person_generation=row.get("person_generation") or "ALLOW_ADULT",
+                    output_resolution=row.get("output_resolution") or row.get("resolution") or output_resolution,
+                    output_format="image/png",
+                    image_input=image_input,
+                    generation_config=generation_config,
+                    negative_prompt=row.get("negative_prompt") or negative_prompt,
+                    custom_model_name=custom_model_name,
+                    priority=priority,
+                    allow_placeholder=False,
+                )
+                record["files"] = self.save_images(images, output_path, index)
+                record["token_count"] = token_count
+                checkpoint["completed"] += 1
+            except Exception as e:
+                if model_management is not None and isinstance(e, model_management.InterruptProcessingException):
+                    raise
+                # endpoint 故障时停止运行且不前进进度，重新运行会从这一行重试
+                if is_endpoint_error(e):
+                    raise Exception(f"Vertex AI Sweep: stopped at row {index}, endpoint unavailable; run again to resume from this row. {e}") from e
+                print(f"Vertex AI Sweep: row {index} failed: {e}")
+                record["error"] = str(e)[:500]
+                checkpoint["failed"] += 1
+            record["latency"] = round(time.time() - start, 2)
+
+            with open(results_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+            checkpoint["next_row"] = index + 1
+            self.save_checkpoint(checkpoint_path, checkpoint)
+            processed += 1
+            print(f"Vertex AI Sweep: row {index} done ({checkpoint['completed']} completed, {checkpoint['failed']} failed)")
+
+        return (output_path, checkpoint["completed"])
+
+    def save_images(self, images, output_path, row_index):
+        files = []
+        for i in range(images.shape[0]):
+            img_np = np.clip(255. * images[i].cpu().numpy(), 0, 255).astype(np.uint8)
+            filename = f"{row_index:06d}_{i}.png"
+            Image.fromarray(img_np).save(os.path.join(output_path, filename))
+            files.append(filename)
+        return files
+
+    def save_checkpoint(self, checkpoint_path, checkpoint):
+        # 先写临时文件再替换，避免中途崩溃损坏进度
+        tmp_path = checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, indent=2)
+        os.replace(tmp_path, checkpoint_path)
@@ -1,4 +1,3 @@
-import requests
 from .base import VertexBase
 from .utils import CACHED_MODELS
 
@@ -22,6 +21,7 @@ class VertexGeminiTextGenerator(VertexBase):
                 "generation_config": ("GENERATION_CONFIG",),
                 "system_instruction": ("STRING", {"multiline": True, "default": "You are a helpful assistant."}),
                 "custom_model_name": ("STRING", {"default": "", "placeholder": "Override model name manually"}),
+                "priority": (["interactive", "batch"], {"default": "interactive"}),
             }
         }
 
@@ -30,18 +30,10 @@ class VertexGeminiTextGenerator(VertexBase):
     FUNCTION = "generate_text"
     CATEGORY = "VertexAI"
 
-    def generate_text(self, vertex_config, prompt, model_name, temperature, max_tokens, safety_filter_level, generation_config=None, system_instruction="", custom_model_name=""):
+    def generate_text(self, vertex_config, prompt, model_name, temperature, max_tokens, safety_filter_level, generation_config=None, system_instruction="", custom_model_name="", priority="interactive"):
         
-        # 从 config 解包参数
-        project_id = vertex_config.get("project_id")
-        location = vertex_config.get("location")
-        service_account_json = vertex_config.get("service_account_json")
-
         target_model = custom_model_name if custom_model_name.strip() else model_name
-        token, auth_project_id = self.get_access_token(service_account_json)
-        final_project_id = project_id if project_id != "auto-detect-if-empty" else auth_project_id
-
-        url = f"https://{location}-aiplatform.googleapis.com/v1/projects/{final_project_id}/locations/{location}/publishers/google/models/{target_model}:generateContent"
+        url, headers = self.resolve_endpoint(vertex_config, target_model, "generateContent")
 
         # 默认 Safety Settings (从 widget 读取)
         threshold_val = safety_filter_level
@@ -81,25 +73,19 @@ class VertexGeminiTextGenerator(VertexBase):
                 "parts": [{"text": system_instruction}]
             }
 
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json; charset=utf-8"
-        }
-
         print(f"VertexAI Text Request to: {target_model}")
 
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
-            response.raise_for_status()
-            result = response.json()
-            
+            result_list = self.post_generate(url, headers, payload, timeout=60, priority=priority)
+
             output_text = ""
-            candidates = result.get('candidates', [])
-            if candidates:
-                parts = candidates[0].get('content', {}).get('parts', [])
-                for part in parts:
-                    if 'text' in part:
-                        output_text += part['text']
+            for result in result_list:
+                candidates = result.get('candidates', [])
+                if candidates:
+                    parts = candidates[0].get('content', {}).get('parts', [])
+                    for part in parts:
+                        if 'text' in part:
+                            output_text += part['text']
             
             # 返回使用的配置
             used_config = {
@@ -114,4 +100,4 @@ class VertexGeminiTextGenerator(VertexBase):
             err = f"Error: {e}"
             if hasattr(e, 'response') and e.response:
                 err += f"\n{e.response.text}"
-            return (err,)
+            return (err, {})
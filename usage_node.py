@@ -0,0 +1,38 @@
+from .ledger import LEDGER
+from .circuit_breaker import BREAKER
+
+class VertexUsageSummary:
+    """
+    【用量统计节点】
+    汇总用量账本中每个模型每天的调用次数、延迟、token、图片数和费用，
+    并附带各 endpoint 的熔断状态
+    """
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "days": ("INT", {"default": 7, "min": 0, "max": 3650, "tooltip": "0 = all"}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("summary",)
+    FUNCTION = "summarize"
+    CATEGORY = "VertexAI"
+    OUTPUT_NODE = True
+
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        # 账本随时在增长，每次都重新汇总
+        return float("nan")
+
+    def summarize(self, days):
+        LEDGER.flush()
+        summary = LEDGER.summarize(days)
+        breakers = BREAKER.status()
+        if breakers:
+            summary += "\n\nEndpoint status:"
+            for key, entry in sorted(breakers.items()):
+                summary += f"\n{key:<48} {entry['state']:<10} failures={entry['failures']} last_latency={entry['last_latency']:.1f}s {entry['last_error']}"
+        print(summary)
+        return (summary,)
@@ -1,4 +1,5 @@
 import os
+import threading
 import requests
 
 # 尝试导入 google 库
@@ -9,6 +10,21 @@ try:
 except ImportError:
     HAS_GOOGLE_AUTH = False
 
+_HTTP_SESSION = None
+_HTTP_SESSION_LOCK = threading.Lock()
+
+def get_http_session():
+    """获取共享的 requests.Session，复用到 Vertex endpoint 的 TLS 连接"""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        with _HTTP_SESSION_LOCK:
+            if _HTTP_SESSION is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=16)
+                session.mount("https://", adapter)
+                _HTTP_SESSION = session
+    return _HTTP_SESSION
+
 def get_dynamic_model_list(location="us-central1"):
     """
     尝试从环境中读取凭证并连接 Google Cloud API 获取模型列表。
@@ -56,6 +72,18 @@ def get_dynamic_model_list(location="us-central1"):
 # 在模块加载时获取一次模型列表
 CACHED_MODELS = get_dynamic_model_list()
 
+def parse_endpoint(url):
+    """
+    从请求 URL 中解析 (location, model)
+    API Key 方式使用全局 endpoint，location 记为 global
+    """
+    import re
+    location_match = re.search(r"/locations/([^/]+)/", url)
+    model_match = re.search(r"/models/([^/:?]+)", url)
+    location = location_match.group(1) if location_match else "global"
+    model = model_match.group(1) if model_match else "unknown"
+    return location, model
+
 def get_config_dir():
     """获取配置文件夹路径"""
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -125,3 +153,59 @@ def tensor_to_base64(image_tensor):
         img.save(buffered, format=fmt)
         
     return base64.b64encode(buffered.getvalue()).decode("utf-8"), mime
+
+def unify_image_batch(images, mode="resize"):
+    """
+    将尺寸不一致的图片 tensor 列表 ([1, H, W, C] 或 [B, H, W, C]) 统一到同一尺寸后拼接为一个 batch。
+    相同尺寸的图片按组一次性处理，避免逐张 Python 循环。
+    mode:
+        resize - 缩放到第一张图片的尺寸
+        pad    - 居中填充黑边到最大宽高
+        crop   - 居中裁剪到最小宽高
+    Returns: [N, H, W, C] tensor
+    """
+    import torch
+    import torch.nn.functional as F
+
+    batch = [img if len(img.shape) == 4 else img.unsqueeze(0) for img in images]
+    shapes = [tuple(img.shape[1:3]) for img in batch]
+
+    # 尺寸一致时直接拼接
+    if len(set(shapes)) <= 1:
+        return torch.cat(batch, dim=0)
+
+    if mode == "pad":
+        target_h, target_w = max(s[0] for s in shapes), max(s[1] for s in shapes)
+    elif mode == "crop":
+        target_h, target_w = min(s[0] for s in shapes), min(s[1] for s in shapes)
+    else:
+        target_h, target_w = shapes[0]
+
+    # 按尺寸分组，记录每组在输出中的位置
+    groups = {}
+    offset = 0
+    for img, shape in zip(batch, shapes):
+        groups.setdefault(shape, ([], []))
+        groups[shape][0].append(img)
+        groups[shape][1].extend(range(offset, offset + img.shape[0]))
+        offset += img.shape[0]
+
+    first = batch[0]
+    output = torch.zeros((offset, target_h, target_w, first.shape[-1]), dtype=first.dtype, device=first.device)
+
+    for (h, w), (tensors, indices) in groups.items():
+        group = torch.cat(tensors, dim=0)
+        if (h, w) != (target_h, target_w):
+            if mode == "pad":
+                top, left = (target_h - h) // 2, (target_w - w) // 2
+                group = F.pad(group, (0, 0, left, target_w - w - left, top, target_h - h - top))
+            elif mode == "crop":
+                top, left = (h - target_h) // 2, (w - target_w) // 2
+                group = group[:, top:top + target_h, left:left + target_w, :]
+            else:
+                # interpolate 需要 [B, C, H, W]
+                group = F.interpolate(group.movedim(-1, 1), size=(target_h, target_w), mode="bilinear", align_corners=False, antialias=True)
+                group = group.movedim(1, -1).clamp(0.0, 1.0)
+        output[indices] = group
+
+    return output
@@ -0,0 +1,79 @@
+import sys
+import torch
+
+from utils import unify_image_batch
+
+
+def build_images():
+    # 每张图片用不同的常数填充，便于检查输出顺序
+    return [
+        torch.full((1, 4, 6, 3), 0.1),
+        torch.full((2, 8, 8, 3), 0.2),
+        torch.full((1, 4, 6, 3), 0.3),
+    ]
+
+
+def position_image(height, width):
+    # 像素值编码行列位置，用于检查填充和裁剪的偏移方向
+    rows = torch.arange(height, dtype=torch.float32).view(height, 1, 1).expand(height, width, 1)
+    cols = torch.arange(width, dtype=torch.float32).view(1, width, 1).expand(height, width, 1)
+    return torch.cat([rows, cols, torch.zeros(height, width, 1)], dim=-1).unsqueeze(0)
+
+
+def test_unify_image_batch():
+    print("Testing unify_image_batch...")
+
+    # 尺寸一致时直接拼接
+    same = unify_image_batch([torch.zeros((1, 4, 4, 3)), torch.ones((2, 4, 4, 3))])
+    assert same.shape == (3, 4, 4, 3)
+    assert same[0].max() == 0 and same[1].min() == 1
+
+    # resize: 缩放到第一张图片的尺寸
+    out = unify_image_batch(build_images(), "resize")
+    assert out.shape == (4, 4, 6, 3)
+    for i, value in enumerate([0.1, 0.2, 0.2, 0.3]):
+        assert torch.allclose(out[i], torch.full((4, 6, 3), value), atol=1e-4), f"resize index {i}"
+
+    # pad: 居中填充到最大宽高
+    out = unify_image_batch(build_images(), "pad")
+    assert out.shape == (4, 8, 8, 3)
+    assert torch.allclose(out[0, 2:6, 1:7], torch.full((4, 6, 3), 0.1))
+    assert out[0, :2].max() == 0 and out[0, :, :1].max() == 0
+    assert torch.allclose(out[1], torch.full((8, 8, 3), 0.2))
+    assert torch.allclose(out[3, 2:6, 1:7], torch.full((4, 6, 3), 0.3))
+
+    # crop: 居中裁剪到最小宽高
+    out = unify_image_batch(build_images(), "crop")
+    assert out.shape == (4, 4, 6, 3)
+    for i, value in enumerate([0.1, 0.2, 0.2, 0.3]):
+        assert torch.allclose(out[i], torch.full((4, 6, 3), value)), f"crop index {i}"
+
+
+
+def test_pad_crop_placement():
+    print("Testing pad / crop placement with non-square images...")
+    small, large = position_image(3, 5), position_image(6, 10)
+
+    # pad: 高差 3 (上 1 下 2)，宽差 5 (左 2 右 3)，行列不能互换
+    out = unify_image_batch([small, large], "pad")
+    assert out.shape == (2, 6, 10, 3)
+    assert torch.equal(out[0, 1:4, 2:7], small[0]), "pad placement"
+    assert out[0, 0].abs().max() == 0 and out[0, 4:].abs().max() == 0
+    assert out[0, :, :2].abs().max() == 0 and out[0, :, 7:].abs().max() == 0
+    assert torch.equal(out[1], large[0])
+
+    # crop: 从 6x10 的中心裁剪 3x5，起点为 (1, 2)
+    out = unify_image_batch([large, small], "crop")
+    assert out.shape == (2, 3, 5, 3)
+    assert torch.equal(out[0], large[0, 1:4, 2:7]), "crop placement"
+    assert torch.equal(out[1], small[0])
+
+
+if __name__ == "__main__":
+    try:
+        test_unify_image_batch()
+        test_pad_crop_placement()
+        print("Batch Verification Passed!")
+    except AssertionError as e:
+        print(f"Verification failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,158 @@
+import sys
+import time
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, is_endpoint_failure, CLOSED, OPEN, HALF_OPEN
+
+KEY = ("us-central1", "gemini-3-pro-image-preview")
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status_code=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = FakeResponse(status_code) if status_code is not None else None
+
+
+def expect_open(breaker, key=KEY):
+    try:
+        breaker.before_request(key)
+    except CircuitOpenError:
+        return
+    raise AssertionError("expected CircuitOpenError")
+
+
+def test_opens_at_threshold():
+    print("Testing breaker opens at the failure threshold...")
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+    for i in range(2):
+        breaker.before_request(KEY)
+        breaker.record_failure(KEY, "HTTP 429")
+        assert breaker.status()["us-central1/gemini-3-pro-image-preview"]["state"] == CLOSED
+    breaker.before_request(KEY)
+    breaker.record_failure(KEY, "HTTP 429")
+    assert breaker.status()["us-central1/gemini-3-pro-image-preview"]["state"] == OPEN
+
+    # 打开期间直接失败，不再发送请求
+    expect_open(breaker)
+    assert not breaker.is_available(KEY)
+
+    # 成功会清零连续失败次数
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+    breaker.record_failure(KEY, "HTTP 500")
+    breaker.record_failure(KEY, "HTTP 500")
+    breaker.record_success(KEY, 1.0)
+    breaker.record_failure(KEY, "HTTP 500")
+    assert breaker.status()["us-central1/gemini-3-pro-image-preview"]["state"] == CLOSED
+
+
+def test_slow_first_response():
+    print("Testing slow first response counts as a failure...")
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60, slow_seconds=5)
+    breaker.record_success(KEY, 6.0)
+    breaker.record_success(KEY, 6.0)
+    assert breaker.status()["us-central1/gemini-3-pro-image-preview"]["state"] == OPEN
+
+
+def test_half_open_single_probe():
+    print("Testing cooldown allows a single half-open probe...")
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    breaker.record_failure(KEY, "HTTP 503")
+    expect_open(breaker)
+    time.sleep(0.06)
+    assert breaker.is_available(KEY)
+
+    # 第一个请求成为试探请求，其余请求被拒绝
+    breaker.before_request(KEY)
+    assert breaker.status()["us-central1/gemini-3-pro-image-preview"]["state"] == HALF_OPEN
+    expect_open(breaker)
+
+    # 试探成功后关闭
+    breaker.record_success(KEY, 1.0)
+    assert breaker.status()["us-central1/gemini-3-pro-image-preview"]["state"] == CLOSED
+    breaker.before_request(KEY)
+
+
+def test_failed_probe_reopens():
+    print("Testing a failed probe reopens the breaker...")
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=0.05)
+    for _ in range(3):
+        breaker.record_failure(KEY, "HTTP 500")
+    time.sleep(0.06)
+    breaker.before_request(KEY)
+    # 半开状态下一次失败就重新打开，不需要再达到阈值
+    breaker.record_failure(KEY, "timeout")
+    entry = breaker.status()["us-central1/gemini-3-pro-image-preview"]
+    assert entry["state"] == OPEN
+    assert entry["last_error"] == "timeout"
+    expect_open(breaker)
+
+
+def test_release_probe_is_neutral():
+    print("Testing release_probe leaves the breaker state unchanged...")
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    breaker.record_failure(KEY, "HTTP 500")
+    time.sleep(0.06)
+    breaker.before_request(KEY)
+    failures = breaker.status()["us-central1/gemini-3-pro-image-preview"]["failures"]
+
+    # 试探请求因为与 endpoint 无关的原因失败 (例如 payload 编码出错)
+    breaker.release_probe(KEY)
+    entry = breaker.status()["us-central1/gemini-3-pro-image-preview"]
+    assert entry["state"] == HALF_OPEN
+    assert entry["failures"] == failures
+    # 下一个请求可以重新试探
+    breaker.before_request(KEY)
+
+
+def test_endpoint_failure_classification():
+    print("Testing which errors count as endpoint failures...")
+    assert is_endpoint_failure(FakeHTTPError(None))
+    assert is_endpoint_failure(FakeHTTPError(429))
+    assert is_endpoint_failure(FakeHTTPError(500))
+    assert is_endpoint_failure(FakeHTTPError(503))
+    assert not is_endpoint_failure(FakeHTTPError(400))
+    assert not is_endpoint_failure(FakeHTTPError(403))
+    assert not is_endpoint_failure(FakeHTTPError(404))
+
+
+def test_select_endpoint_reroutes():
+    print("Testing select_endpoint reroutes to a fallback location...")
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    model = KEY[1]
+    url = f"https://us-central1-aiplatform.googleapis.com/v1/projects/p/locations/us-central1/publishers/google/models/{model}:streamGenerateContent"
+
+    # 可用时不改变
+    assert breaker.select_endpoint(url, "us-central1", model, ["europe-west4"]) == (url, "us-central1")
+
+    breaker.record_failure(KEY, "HTTP 503")
+    new_url, location = breaker.select_endpoint(url, "us-central1", model, ["us-central1", "europe-west4"])
+    assert location == "europe-west4"
+    assert new_url == url.replace("us-central1", "europe-west4")
+
+    # 备用区域也熔断时保持原区域，由 before_request 直接失败
+    breaker.record_failure(("europe-west4", model), "HTTP 503")
+    assert breaker.select_endpoint(url, "us-central1", model, ["europe-west4"]) == (url, "us-central1")
+
+    # 全局 endpoint (API Key) 不切换区域
+    global_url = f"https://aiplatform.googleapis.com/v1/publishers/google/models/{model}:streamGenerateContent"
+    breaker.record_failure(("global", model), "HTTP 503")
+    assert breaker.select_endpoint(global_url, "global", model, ["europe-west4"]) == (global_url, "global")
+
+
+if __name__ == "__main__":
+    try:
+        test_opens_at_threshold()
+        test_slow_first_response()
+        test_half_open_single_probe()
+        test_failed_probe_reopens()
+        test_release_probe_is_neutral()
+        test_endpoint_failure_classification()
+        test_select_endpoint_reroutes()
+        print("Circuit Breaker Verification Passed!")
+    except AssertionError as e:
+        print(f"Verification failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,44 @@
+import sys
+import gzip
+import json
+import base64
+
+from encoding import encode_body, iter_json_chunks
+
+
+def build_payload():
+    return {
+        "contents": [{"role": "user", "parts": [
+            {"text": "引号 \" 反斜杠 \\ 换行 \n"},
+            {"inlineData": {"mimeType": "image/jpeg", "data": base64.b64encode(bytes(range(256)) * 64).decode("utf-8")}},
+            {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(b"second image").decode("utf-8")}},
+        ]}],
+        "generationConfig": {"temperature": 0.5, "responseModalities": ["TEXT", "IMAGE"]},
+        "systemInstruction": {"parts": [{"text": "__VERTEX_BLOB_0__ is plain text"}]},
+    }
+
+
+def test_encoding():
+    print("Testing request body encoding...")
+    payload = build_payload()
+
+    body, headers = encode_body(payload, compression="off")
+    assert headers == {}
+    assert json.loads(body) == payload
+    assert b"".join(iter_json_chunks(payload)) == body
+
+    body, headers = encode_body(payload, compression="gzip")
+    assert headers == {"Content-Encoding": "gzip"}
+    assert json.loads(gzip.decompress(body)) == payload
+
+    # payload 本身不应被修改
+    assert payload == build_payload()
+    print("Encoding Verification Passed!")
+
+
+if __name__ == "__main__":
+    try:
+        test_encoding()
+    except AssertionError as e:
+        print(f"Verification failed: {e}")
+        sys.exit(1)
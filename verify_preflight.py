@@ -0,0 +1,84 @@
+import sys
+
+from preflight import estimate_image_tokens, estimate_request_tokens, plan_image_sizes, fit_images_to_budget
+
+
+class FakeImage:
+    """只有 shape 的图片，预算足够或只丢弃图片时不会被缩放"""
+    def __init__(self, height, width, name=""):
+        self.shape = (height, width, 3)
+        self.name = name
+
+
+def test_estimate_image_tokens():
+    print("Testing image token estimate...")
+    assert estimate_image_tokens(384, 384) == 258
+    assert estimate_image_tokens(100, 384) == 258
+    assert estimate_image_tokens(385, 100) == 258
+    assert estimate_image_tokens(768, 768) == 258
+    assert estimate_image_tokens(769, 768) == 2 * 258
+    assert estimate_image_tokens(1024, 1024) == 4 * 258
+    assert estimate_image_tokens(2048, 1536) == 3 * 2 * 258
+    assert estimate_request_tokens("abcdefgh", [(1024, 1024), (300, 300)]) == 2 + 4 * 258 + 258
+
+
+def test_plan_downscales_largest_first():
+    print("Testing downscale plan...")
+    # 2048x2048 = 9 片，1024x1024 = 4 片，先缩小最大的图片
+    sizes, tokens = plan_image_sizes("", [(1024, 1024), (2048, 2048)], 8 * 258)
+    print(f"Planned sizes: {sizes}, tokens: {tokens}")
+    assert sizes == [(1024, 1024), (1024, 1024)]
+    assert tokens == 8 * 258
+
+    # 切片数相同时先缩小靠前的图片，每张图片只在需要时继续减半
+    sizes, tokens = plan_image_sizes("", [(1024, 1024), (2048, 2048)], 7 * 258)
+    print(f"Planned sizes: {sizes}, tokens: {tokens}")
+    assert sizes == [(512, 512), (1024, 1024)]
+    assert tokens == estimate_request_tokens("", sizes) == 5 * 258
+
+
+def test_plan_drops_from_end():
+    print("Testing drop order...")
+    # 图片缩小到单个切片后仍超出预算，从末尾开始丢弃
+    sizes, tokens = plan_image_sizes("x" * 40, [(2048, 2048), (300, 300), (1536, 1536)], 2 * 258 + 10)
+    print(f"Planned sizes: {sizes}, tokens: {tokens}")
+    assert len(sizes) == 2
+    assert sizes[1] == (300, 300)
+    assert estimate_image_tokens(*sizes[0]) == 258
+    assert tokens == 10 + 2 * 258
+
+
+def test_fit_images_within_budget():
+    print("Testing images within budget are returned unchanged...")
+    images = [FakeImage(1024, 1024, "a"), FakeImage(300, 300, "b")]
+    result, tokens, actions = fit_images_to_budget("hello", images, 10000)
+    assert result == images
+    assert tokens == 2 + 4 * 258 + 258
+    assert actions == []
+
+    # budget <= 0 表示不限制
+    result, tokens, actions = fit_images_to_budget("hello", images, 0)
+    assert result == images and actions == []
+
+
+def test_fit_images_drops():
+    print("Testing fit_images_to_budget drop path...")
+    images = [FakeImage(300, 300, "a"), FakeImage(200, 200, "b"), FakeImage(100, 100, "c")]
+    result, tokens, actions = fit_images_to_budget("", images, 258)
+    print(f"Kept: {[img.name for img in result]}, actions: {actions}")
+    assert [img.name for img in result] == ["a"]
+    assert tokens == 258
+    assert actions == ["dropped reference image", "dropped reference image"]
+
+
+if __name__ == "__main__":
+    try:
+        test_estimate_image_tokens()
+        test_plan_downscales_largest_first()
+        test_plan_drops_from_end()
+        test_fit_images_within_budget()
+        test_fit_images_drops()
+        print("Preflight Verification Passed!")
+    except AssertionError as e:
+        print(f"Verification failed: {e}")
+        sys.exit(1)
@@ -34,7 +34,7 @@ def test_redesign():
     node = VertexGeminiImageGenerator()
     
     # Mock requests.post
-    with patch('requests.post') as mock_post:
+    with patch('requests.Session.post') as mock_post:
         mock_response = MagicMock()
         mock_response.status_code = 200
         # Mock response with dummy image data
@@ -74,7 +74,7 @@ def test_redesign():
         # Verify Call Args
         args, kwargs = mock_post.call_args
         url = args[0]
-        json_body = kwargs['json']
+        json_body = json.loads(kwargs['data'])
         
         print(f"URL: {url}")
         print(f"Payload: {json.dumps(json_body, indent=2)}")
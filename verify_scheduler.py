@@ -0,0 +1,100 @@
+import sys
+import time
+import heapq
+import threading
+
+from scheduler import RequestScheduler, prompt_queue_number
+
+
+def vertex_prompt(priority):
+    return {"1": {"class_type": "VertexGeminiImageGenerator", "inputs": {"priority": priority}}}
+
+
+def test_prompt_queue_order():
+    print("Testing prompt queue priority...")
+    queue = []
+    number = 0
+
+    def put(priority, client_id):
+        nonlocal number
+        item = (number, f"p{number}", vertex_prompt(priority), {"client_id": client_id}, [])
+        number += 1
+        heapq.heappush(queue, (prompt_queue_number(queue, item),) + item[1:])
+
+    # 客户端 A 先提交 4 个 batch，B 再提交 2 个 batch，最后 C 提交一个预览
+    for _ in range(4):
+        put("batch", "A")
+    for _ in range(2):
+        put("batch", "B")
+    put("interactive", "C")
+
+    order = []
+    while queue:
+        item = heapq.heappop(queue)
+        order.append(item[3]["client_id"])
+    print(f"Execution order: {order}")
+    assert order == ["C", "A", "B", "A", "B", "A", "A"]
+
+
+def test_prompt_queue_keeps_client_order():
+    print("Testing prompt queue order after partial execution...")
+    queue = []
+    number = 0
+
+    def put(client_id):
+        nonlocal number
+        item = (number, f"p{number}", vertex_prompt("batch"), {"client_id": client_id}, [])
+        number += 1
+        heapq.heappush(queue, (prompt_queue_number(queue, item),) + item[1:])
+
+    # 客户端 A 提交 p0-p3，执行 p0、p1 后再提交 p4，p4 应排在 p3 之后
+    for _ in range(4):
+        put("A")
+    heapq.heappop(queue)
+    heapq.heappop(queue)
+    put("A")
+
+    order = []
+    while queue:
+        order.append(heapq.heappop(queue)[1])
+    print(f"Execution order: {order}")
+    assert order == ["p2", "p3", "p4"]
+
+
+def test_concurrent_interleaving():
+    print("Testing in-process scheduler with concurrent callers...")
+    scheduler = RequestScheduler(1, {"interactive": 1, "batch": 1})
+    order = []
+
+    def job(priority, workflow_id):
+        with scheduler.slot(priority, workflow_id):
+            order.append((priority, workflow_id))
+            time.sleep(0.02)
+
+    # 第一个请求占住唯一的并发槽，其余请求在它执行期间排队
+    threads = [threading.Thread(target=job, args=("batch", "A"))]
+    threads[0].start()
+    time.sleep(0.005)
+    for args in [("batch", "A"), ("batch", "A"), ("batch", "B"), ("batch", "B"), ("interactive", "C")]:
+        thread = threading.Thread(target=job, args=args)
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+
+    print(f"Execution order: {order}")
+    assert order[0] == ("batch", "A")
+    assert order[1] == ("interactive", "C")
+    assert [w for _, w in order[2:]] == ["A", "B", "A", "B"] or [w for _, w in order[2:]] == ["B", "A", "B", "A"]
+
+
+if __name__ == "__main__":
+    try:
+        test_prompt_queue_order()
+        test_prompt_queue_keeps_client_order()
+        test_concurrent_interleaving()
+        print("Scheduler Verification Passed!")
+    except AssertionError as e:
+        print(f"Verification failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,81 @@
+import os
+import json
+import socket
+import threading
+from .utils import list_config_files, load_config_file, get_http_session
+
+# 设置 VERTEX_WARMUP=1 开启启动预热
+WARMUP_ENABLED = os.environ.get("VERTEX_WARMUP", "").lower() in ("1", "true", "yes")
+
+
+def collect_endpoints():
+    """
+    从配置文件中收集需要预热的 host 和 service account
+    Returns: (hosts, service_accounts)
+    """
+    hosts = set()
+    service_accounts = set()
+    key_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "key")
+    for config_file in list_config_files():
+        vertex_config = load_config_file(config_file).get("vertex_config") or {}
+        if vertex_config.get("api_key"):
+            hosts.add("aiplatform.googleapis.com")
+        service_account_json = vertex_config.get("service_account_json")
+        if service_account_json and os.path.isfile(os.path.join(key_dir, service_account_json)):
+            service_accounts.add(service_account_json)
+            location = load_service_account_location(os.path.join(key_dir, service_account_json))
+            if location:
+                hosts.add(f"{location}-aiplatform.googleapis.com")
+    return hosts, service_accounts
+
+
+def load_service_account_location(path):
+    with open(path, "r") as f:
+        return json.load(f).get("location")
+
+
+def warm_up():
+    """解析 DNS、建立连接池中的 TLS 连接、获取 token、预加载图片编解码器"""
+    from .base import VertexBase
+
+    # 1. 预加载图片编解码器
+    from PIL import Image
+    import io
+    Image.init()
+    for fmt in ("PNG", "JPEG"):
+        buffered = io.BytesIO()
+        Image.new("RGB", (8, 8)).save(buffered, format=fmt)
+        buffered.seek(0)
+        Image.open(buffered).convert("RGB")
+
+    try:
+        hosts, service_accounts = collect_endpoints()
+    except Exception as e:
+        print(f"Vertex AI: Warm-up failed to read configs: {e}")
+        return
+
+    # 2. DNS 解析和 TLS 连接 (连接保留在共享 session 的连接池中)
+    session = get_http_session()
+    for host in hosts:
+        try:
+            socket.getaddrinfo(host, 443)
+            session.head(f"https://{host}/", timeout=10)
+        except Exception as e:
+            print(f"Vertex AI: Warm-up connection to {host} failed: {e}")
+
+    # 3. 为每个 service account 获取 token (缓存在 VertexBase 中)
+    node = VertexBase()
+    for service_account_json in service_accounts:
+        try:
+            node.get_access_token(service_account_json)
+        except Exception as e:
+            print(f"Vertex AI: Warm-up token for {service_account_json} failed: {e}")
+
+    print(f"Vertex AI: Warm-up finished ({len(hosts)} hosts, {len(service_accounts)} service accounts)")
+
+
+def start_warmup():
+    """在后台线程中预热，不阻塞 ComfyUI 启动"""
+    if not WARMUP_ENABLED:
+        return
+    threading.Thread(target=warm_up, name="VertexWarmup", daemon=True).start()